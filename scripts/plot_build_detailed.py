@@ -1,111 +1,170 @@
-import argparse
 import os
-import pandas as pd
-import matplotlib.pyplot as plt
+import numpy as np
+from plot_common import (
+    MAX_BOX_POINTS, SCATTER_MAX_POINTS, base_parser, box_stats, load_cached, new_axes,
+    plot_boxplot, plot_errorbar, read_numeric_csv, render, save_aggregated, save_figure,
+)
+
+# only the columns the aggregation and plots read; elapsed_ms is inferred so integer
+# timings keep min_ms/max_ms integral in the saved table
+DTYPES = {
+    "threads": "Int64",
+    "elapsed_ms": None,
+}
+
+def load_and_aggregate(path):
+    df = read_numeric_csv(path, DTYPES)
+
+    df = df.dropna(subset=["threads","elapsed_ms"])
+    df = df[df["threads"] > 0]
+    df = df[df["elapsed_ms"] > 0]
+
+    # aggregate per threads; the same grouping also yields the per-threads values for the boxplot
+    gb = df.groupby("threads", sort=True)["elapsed_ms"]
+    # only what the plots use; min/max/runs for the table are filled in from groups when saving
+    agg = gb.agg(
+        mean_ms="mean",
+        std_ms="std",
+    ).reset_index()
+    groups = {th: vals.to_numpy() for th, vals in gb}
+    return df, agg, groups
+
+STREAM_CHUNK_ROWS = 200_000
+
+# --streaming: memory stays O(threads values) instead of O(rows). Per-threads
+# count/mean/M2/min/max are merged chunk by chunk (Chan's parallel variance), and a
+# uniform sample of up to MAX_BOX_POINTS elapsed values per threads is kept
+# (bottom-k on random keys) for the boxplot and the scatter
+def load_streaming(path):
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    stats = {}    # threads -> [runs, mean, m2, min, max]
+    samples = {}  # threads -> (keys, values)
+    integral = True  # elapsed_ms integer in every chunk: min/max stay integers, as in load_and_aggregate
+    for chunk in pd.read_csv(path, usecols=["threads","elapsed_ms"], chunksize=STREAM_CHUNK_ROWS):
+        chunk = chunk.apply(pd.to_numeric, errors="coerce").dropna()
+        chunk = chunk[(chunk["threads"] > 0) & (chunk["elapsed_ms"] > 0)]
+        integral = integral and pd.api.types.is_integer_dtype(chunk["elapsed_ms"])
+        for th, vals in chunk.groupby("threads")["elapsed_ms"]:
+            vals = vals.to_numpy(float)
+            n, mean = len(vals), vals.mean()
+            m2 = ((vals - mean) ** 2).sum()
+            if th in stats:
+                n0, mean0, m2_0, lo, hi = stats[th]
+                total = n0 + n
+                delta = mean - mean0
+                stats[th] = [total, mean0 + delta * n / total, m2_0 + m2 + delta * delta * n0 * n / total,
+                             min(lo, vals.min()), max(hi, vals.max())]
+            else:
+                stats[th] = [n, mean, m2, vals.min(), vals.max()]
+
+            keys = rng.random(n)
+            if th in samples:
+                keys = np.concatenate([samples[th][0], keys])
+                vals = np.concatenate([samples[th][1], vals])
+            if len(keys) > MAX_BOX_POINTS:
+                keep = np.argpartition(keys, MAX_BOX_POINTS)[:MAX_BOX_POINTS]
+                keys, vals = keys[keep], vals[keep]
+            samples[th] = (keys, vals)
+
+    ths = sorted(stats)
+    runs = np.array([stats[th][0] for th in ths])
+    m2 = np.array([stats[th][2] for th in ths])
+    extreme = lambda i: np.array([stats[th][i] for th in ths], dtype=np.int64 if integral else float)
+    agg = pd.DataFrame({
+        "threads": pd.Series(ths),
+        "mean_ms": [stats[th][1] for th in ths],
+        "std_ms": np.sqrt(np.divide(m2, runs - 1, out=np.full_like(m2, np.nan), where=runs > 1)),
+        "min_ms": extreme(3),
+        "max_ms": extreme(4),
+        "runs": runs,
+    })
+    groups = {th: samples[th][1] for th in ths}
+    df = pd.DataFrame({
+        "threads": np.repeat(ths, [len(v) for v in groups.values()]),
+        "elapsed_ms": np.concatenate(list(groups.values())),
+    })
+    return df, agg, groups
+
+def plot_scatter(path, title, dpi, logy, threads, elapsed_ms):
+    ax = new_axes()
+    if len(elapsed_ms) > SCATTER_MAX_POINTS:
+        # too many overlapping markers: bin them instead of drawing each one
+        hb = ax.hexbin(threads, elapsed_ms, gridsize=40, mincnt=1, yscale="log" if logy else "linear")
+        ax.figure.colorbar(hb, ax=ax, label="runs")
+    else:
+        ax.plot(threads, elapsed_ms, marker="o", markersize=3, linestyle="None", rasterized=True)
+    ax.set_xlabel("Threads")
+    ax.set_ylabel("Elapsed (ms) per run")
+    ax.set_title(f"{title}: raw points (each run)")
+    ax.grid(True)
+    if logy:
+        ax.set_yscale("log")
+    save_figure(ax.figure, path, dpi)
 
 def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--input", required=True, help="build_summary.csv")
-    ap.add_argument("--outdir", required=True, help="output folder")
-    ap.add_argument("--title", default="Build benchmark", help="base title")
-    ap.add_argument("--dpi", type=int, default=250)
+    ap = base_parser("build_summary.csv", "Build benchmark")
     ap.add_argument("--logy", action="store_true", help="log scale for elapsed plots")
+    ap.add_argument("--streaming", action="store_true",
+                    help="read the input in chunks with online per-threads stats (for CSVs larger than RAM); "
+                         "boxplot and scatter use a sample of runs")
     args = ap.parse_args()
 
     os.makedirs(args.outdir, exist_ok=True)
-    df = pd.read_csv(args.input)
-
-    # numeric
-    for c in ["threads","run","elapsed_ms","scanned","indexed","skipped","errors"]:
-        if c in df.columns:
-            df[c] = pd.to_numeric(df[c], errors="coerce")
-
-    df = df.dropna(subset=["threads","elapsed_ms"])
-    df = df[df["threads"] > 0]
-    df = df[df["elapsed_ms"] > 0]
-
-    # aggregate per threads
-    agg = df.groupby("threads", as_index=False).agg(
-        mean_ms=("elapsed_ms", "mean"),
-        std_ms=("elapsed_ms", "std"),
-        min_ms=("elapsed_ms", "min"),
-        max_ms=("elapsed_ms", "max"),
-        runs=("elapsed_ms", "count"),
-    ).sort_values("threads")
+    if args.streaming:
+        df, agg, groups = load_cached(args.input, args.outdir, "build_stream", load_streaming, not args.no_cache)
+    else:
+        df, agg, groups = load_cached(args.input, args.outdir, "build", load_and_aggregate, not args.no_cache)
 
     # baseline = mean at smallest threads (usually 1)
     base_threads = int(agg["threads"].iloc[0])
     base_ms = float(agg["mean_ms"].iloc[0])
 
-    agg["speedup"] = base_ms / agg["mean_ms"]
-    agg["efficiency"] = agg["speedup"] / agg["threads"]
-
-    # 1) elapsed vs threads (mean ± std)
-    plt.figure(figsize=(10,6))
-    plt.errorbar(agg["threads"], agg["mean_ms"], yerr=agg["std_ms"], marker="o", capsize=4)
-    plt.xlabel("Threads")
-    plt.ylabel("Elapsed (ms) mean ± std")
-    plt.title(f"{args.title}: elapsed vs threads (baseline={base_threads})")
-    plt.grid(True)
-    if args.logy:
-        plt.yscale("log")
-    plt.savefig(os.path.join(args.outdir, "build_elapsed_vs_threads.png"), dpi=args.dpi, bbox_inches="tight")
-
-    # 2) speedup vs threads
-    plt.figure(figsize=(10,6))
-    plt.plot(agg["threads"], agg["speedup"], marker="o")
-    plt.xlabel("Threads")
-    plt.ylabel(f"Speedup (T{base_threads} / Tn)")
-    plt.title(f"{args.title}: speedup vs threads")
-    plt.grid(True)
-    plt.savefig(os.path.join(args.outdir, "build_speedup_vs_threads.png"), dpi=args.dpi, bbox_inches="tight")
-
-    # 3) efficiency vs threads
-    plt.figure(figsize=(10,6))
-    plt.plot(agg["threads"], agg["efficiency"], marker="o")
-    plt.xlabel("Threads")
-    plt.ylabel("Efficiency = speedup / threads")
-    plt.title(f"{args.title}: parallel efficiency")
-    plt.grid(True)
-    plt.ylim(0, max(1.05, float(agg["efficiency"].max()) * 1.1))
-    plt.savefig(os.path.join(args.outdir, "build_efficiency_vs_threads.png"), dpi=args.dpi, bbox_inches="tight")
-
-    # 4) boxplot elapsed per threads (distribution across runs)
-    data = []
-    labels = []
-    for th in agg["threads"].tolist():
-        vals = df.loc[df["threads"] == th, "elapsed_ms"].dropna().tolist()
-        if vals:
-            data.append(vals)
-            labels.append(str(int(th)))
-
-    if data:
-        plt.figure(figsize=(12,6))
-        plt.boxplot(data, labels=labels, showfliers=True)
-        plt.xlabel("Threads")
-        plt.ylabel("Elapsed (ms) distribution across runs")
-        plt.title(f"{args.title}: elapsed distribution (boxplot)")
-        plt.grid(True)
-        if args.logy:
-            plt.yscale("log")
-        plt.savefig(os.path.join(args.outdir, "build_elapsed_boxplot.png"), dpi=args.dpi, bbox_inches="tight")
-
-    # 5) scatter: elapsed per run (видно разброс)
-    plt.figure(figsize=(10,6))
-    plt.plot(df["threads"], df["elapsed_ms"], marker="o", linestyle="None")
-    plt.xlabel("Threads")
-    plt.ylabel("Elapsed (ms) per run")
-    plt.title(f"{args.title}: raw points (each run)")
-    plt.grid(True)
-    if args.logy:
-        plt.yscale("log")
-    plt.savefig(os.path.join(args.outdir, "build_elapsed_scatter.png"), dpi=args.dpi, bbox_inches="tight")
+    threads = agg["threads"].to_numpy(float)
+    speedup = base_ms / agg["mean_ms"].to_numpy()
+    efficiency = speedup / threads
+    out = lambda name: os.path.join(args.outdir, f"{name}.{args.format}")
+
+    # 4) boxplot data: elapsed per threads (distribution across runs)
+    stats = [box_stats(vals, f"{th:g}") for th, vals in groups.items()]
+
+    tasks = [
+        # 1) elapsed vs threads (mean ± std)
+        (plot_errorbar, out("build_elapsed_vs_threads"),
+         f"{args.title}: elapsed vs threads (baseline={base_threads})", "Threads", "Elapsed (ms) mean ± std",
+         args.dpi, threads, [(None, agg["mean_ms"].to_numpy(), agg["std_ms"].to_numpy())], None, args.logy),
+        # 2) speedup vs threads
+        (plot_errorbar, out("build_speedup_vs_threads"),
+         f"{args.title}: speedup vs threads", "Threads", f"Speedup (T{base_threads} / Tn)",
+         args.dpi, threads, [(None, speedup, None)]),
+        # 3) efficiency vs threads
+        (plot_errorbar, out("build_efficiency_vs_threads"),
+         f"{args.title}: parallel efficiency", "Threads", "Efficiency = speedup / threads",
+         args.dpi, threads, [(None, efficiency, None)], (0, max(1.05, float(efficiency.max()) * 1.1))),
+        # 5) scatter: elapsed per run (видно разброс)
+        (plot_scatter, out("build_elapsed_scatter"), args.title, args.dpi, args.logy,
+         df["threads"].to_numpy(float), df["elapsed_ms"].to_numpy()),
+    ]
+    if stats:
+        tasks.append((plot_boxplot, out("build_elapsed_boxplot"),
+                      f"{args.title}: elapsed distribution (boxplot)", "Threads",
+                      "Elapsed (ms) distribution across runs", args.dpi, stats, args.logy))
+
+    render(tasks)
 
     # save aggregated table too
-    agg.to_csv(os.path.join(args.outdir, "build_aggregated.csv"), index=False)
+    if "runs" not in agg:  # the streaming loader tracks them exactly; groups there is only a sample
+        agg.insert(3, "min_ms", [vals.min() for vals in groups.values()])
+        agg.insert(4, "max_ms", [vals.max() for vals in groups.values()])
+        agg.insert(5, "runs", [len(vals) for vals in groups.values()])
+    agg["speedup"] = speedup
+    agg["efficiency"] = efficiency
+    saved = save_aggregated(agg, os.path.join(args.outdir, "build_aggregated"), write_csv=not args.no_csv)
 
     print("Saved plots to:", args.outdir)
-    print("Saved aggregated:", os.path.join(args.outdir, "build_aggregated.csv"))
+    for path in saved:
+        print("Saved aggregated:", path)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,205 @@
+import argparse
+import hashlib
+import os
+import re
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+# headless: pick Agg up front (also for subprocesses) instead of probing GUI backends
+os.environ.setdefault("MPLBACKEND", "Agg")
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+# above this many raw points the per-run scatter is drawn in a cheaper form
+SCATTER_MAX_POINTS = 5000
+
+# boxplot stats for ax.bxp, computed here instead of inside matplotlib's boxplot
+# (same rules: linear percentiles, whiskers at the last point within 1.5 IQR);
+# at most MAX_FLIERS outliers per box are kept for drawing; groups larger than
+# MAX_BOX_POINTS are summarized from a fixed-seed uniform subsample of that size
+MAX_FLIERS = 100
+MAX_BOX_POINTS = 4000
+
+def base_parser(input_help, default_title):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--input", required=True, help=input_help)
+    ap.add_argument("--outdir", required=True, help="output folder")
+    ap.add_argument("--title", default=default_title, help="base title")
+    ap.add_argument("--dpi", type=int, default=250)
+    ap.add_argument("--format", choices=["png", "webp", "svg"], default="png", help="image format for the plots")
+    ap.add_argument("--no-csv", action="store_true", help="don't write the aggregated table as CSV (Parquet only; ignored if no Parquet engine is installed)")
+    ap.add_argument("--no-cache", action="store_true", help="ignore and don't write the parsed-data cache in outdir")
+    return ap
+
+# content hash of the input CSV, keys the parsed-data cache in outdir
+def input_key(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+# bump when the cached layout changes in a way cache_tag() can't see
+CACHE_VERSION = 1
+
+# code/environment part of the cache key: the loader's module source (its DTYPES and
+# aggregation), this module, and the pandas version the pickle is written with
+def cache_tag(loader):
+    import pandas as pd
+
+    h = hashlib.blake2b(digest_size=8)
+    h.update(f"{CACHE_VERSION}:{pd.__version__}".encode())
+    for mod in (sys.modules[loader.__module__], sys.modules[__name__]):
+        with open(mod.__file__, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+# loader(path) result, pickled in outdir under the input's hash and reused on reruns
+def load_cached(path, outdir, name, loader, use_cache=True):
+    # pandas is imported only here so --help stays fast
+    import pandas as pd
+
+    cache = os.path.join(outdir, f".cache_{name}_{cache_tag(loader)}_{input_key(path)}.pkl")
+    if use_cache and os.path.exists(cache):
+        try:
+            return pd.read_pickle(cache)
+        except Exception as e:
+            # corrupt or unreadable (e.g. written by another pandas): rebuild it below
+            print("Ignoring unreadable cache", cache, f"({type(e).__name__})")
+    result = loader(path)
+    if use_cache:
+        # write to a temp file next to the cache and rename it into place, so an
+        # interrupted or concurrent run never leaves a truncated pickle behind
+        fd, tmp = tempfile.mkstemp(dir=outdir, prefix=os.path.basename(cache) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pd.to_pickle(result, f)
+            os.replace(tmp, cache)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        # only the latest cache per name is kept: drop the ones for older inputs,
+        # code or pandas versions (also the untagged .cache_<name>_<key>.pkl layout)
+        stale = re.compile(rf"\.cache_{re.escape(name)}_(?:[0-9a-f]+_)?[0-9a-f]+\.pkl")
+        for f in os.listdir(outdir):
+            if stale.fullmatch(f) and f != os.path.basename(cache):
+                try:
+                    os.remove(os.path.join(outdir, f))
+                except FileNotFoundError:
+                    pass  # already removed by a concurrent run
+    return result
+
+# dtypes: {column: dtype or None}; only the columns present in the file are read.
+# None lets pandas infer the column (integer input stays int64, as with pd.to_numeric)
+def read_numeric_csv(path, dtypes):
+    import pandas as pd
+
+    # read only the numeric columns we need, with fixed dtypes where given (no coercion pass)
+    header = pd.read_csv(path, nrows=0).columns
+    cols = [c for c in dtypes if c in header]
+    try:
+        df = pd.read_csv(path, usecols=cols, dtype={c: dtypes[c] for c in cols if dtypes[c] is not None})
+        # an inferred column with non-numeric cells comes out as object
+        coerce = [c for c in cols if not pd.api.types.is_numeric_dtype(df[c])]
+    except (ValueError, TypeError):
+        # non-numeric cells (ValueError) or fractional values in an Int64 column (TypeError)
+        df = pd.read_csv(path, usecols=cols)
+        coerce = cols
+    if coerce:
+        # one pass, non-numeric cells become NaN
+        df[coerce] = df[coerce].apply(pd.to_numeric, errors="coerce")
+    return df
+
+def box_stats(vals, label):
+    rng = np.random.default_rng(0)
+    if len(vals) > MAX_BOX_POINTS:
+        vals = rng.choice(vals, MAX_BOX_POINTS, replace=False)
+    # np.percentile selects via np.partition (introselect), so this stays O(n) without a full sort
+    q1, med, q3 = np.percentile(vals, [25, 50, 75])
+    iqr = q3 - q1
+    inside = vals[(vals >= q1 - 1.5 * iqr) & (vals <= q3 + 1.5 * iqr)]
+    whislo, whishi = inside.min(), inside.max()
+    fliers = vals[(vals < whislo) | (vals > whishi)]
+    if len(fliers) > MAX_FLIERS:
+        fliers = rng.choice(fliers, MAX_FLIERS, replace=False)
+    return {"label": label, "med": med, "q1": q1, "q3": q3, "whislo": whislo, "whishi": whishi, "fliers": fliers}
+
+# one Figure per (worker) process, cleared and resized between plots instead of
+# allocating a fresh canvas for each one; constrained layout fits the labels so
+# savefig doesn't need bbox_inches="tight" (an extra render pass per save)
+_fig = None
+
+def new_axes(figsize=(10,6)):
+    global _fig
+    if _fig is None:
+        _fig = plt.figure(figsize=figsize, layout="constrained")
+    else:
+        _fig.clf()
+        if tuple(_fig.get_size_inches()) != figsize:
+            _fig.set_size_inches(*figsize)
+    return _fig.add_subplot(111)
+
+# format follows the path's extension; webp is encoded by Pillow from the Agg raster
+# (smaller and faster than zlib PNG), svg skips rasterization for line plots
+def save_figure(fig, path, dpi):
+    if path.endswith(".webp"):
+        fig.savefig(path, dpi=dpi, pil_kwargs={"quality": 92, "method": 4})
+    else:
+        fig.savefig(path, dpi=dpi)
+
+# each plot is rendered in its own worker process; args are plain ndarrays/lists
+# lines: [(label or None, y, yerr or None), ...]
+def plot_errorbar(path, title, xlabel, ylabel, dpi, x, lines, ylim=None, logy=False):
+    ax = new_axes()
+    for label, y, yerr in lines:
+        if yerr is None:
+            ax.plot(x, y, marker="o", markersize=3, label=label)
+        else:
+            ax.errorbar(x, y, yerr=yerr, marker="o", markersize=3, capsize=4, elinewidth=0.8, label=label)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.set_title(title)
+    ax.grid(True)
+    if logy:
+        ax.set_yscale("log")
+    if ylim is not None:
+        ax.set_ylim(*ylim)
+    if any(label for label, _, _ in lines):
+        ax.legend()
+    save_figure(ax.figure, path, dpi)
+
+def plot_boxplot(path, title, xlabel, ylabel, dpi, stats, logy=False):
+    ax = new_axes((12,6))
+    ax.bxp(stats, showfliers=True)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.set_title(title)
+    ax.grid(True)
+    if logy:
+        ax.set_yscale("log")
+    save_figure(ax.figure, path, dpi)
+
+# tasks: [(plot_fn, *args), ...], rendered in parallel; worker errors are re-raised here
+def render(tasks):
+    with ProcessPoolExecutor(max_workers=min(len(tasks), os.cpu_count() or 1)) as ex:
+        for f in [ex.submit(*t) for t in tasks]:
+            f.result()
+
+# aggregated table: zstd Parquet when an engine (pyarrow/fastparquet) is installed, plus CSV for humans;
+# without an engine the CSV is written even if write_csv is off, so the table is never dropped
+def save_aggregated(agg, base, write_csv=True):
+    saved = []
+    try:
+        agg.to_parquet(base + ".parquet", compression="zstd", index=False)
+        saved.append(base + ".parquet")
+    except ImportError:
+        print("Parquet engine not installed, skipping", base + ".parquet")
+        if not write_csv:
+            print("Writing CSV instead despite --no-csv")
+            write_csv = True
+    if write_csv:
+        agg.to_csv(base + ".csv", index=False)
+        saved.append(base + ".csv")
+    return saved
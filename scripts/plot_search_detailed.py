@@ -1,28 +1,35 @@
-import argparse
 import os
-import pandas as pd
-import matplotlib.pyplot as plt
-
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--input", required=True, help="search_summary.csv")
-    ap.add_argument("--outdir", required=True, help="output folder")
-    ap.add_argument("--title", default="Search benchmark", help="base title")
-    ap.add_argument("--dpi", type=int, default=250)
-    args = ap.parse_args()
-
-    os.makedirs(args.outdir, exist_ok=True)
-    df = pd.read_csv(args.input)
-
-    # ensure numeric
-    for c in ["clients","run","rps","p50_ms","p95_ms","p99_ms","ok","fail","total","duration_s","topk"]:
-        if c in df.columns:
-            df[c] = pd.to_numeric(df[c], errors="coerce")
-
-    df["ok_rate"] = df["ok"] / (df["ok"] + df["fail"]).replace(0, pd.NA)
+import numpy as np
+from plot_common import (
+    SCATTER_MAX_POINTS, base_parser, box_stats, load_cached, new_axes,
+    plot_boxplot, plot_errorbar, read_numeric_csv, render, save_aggregated, save_figure,
+)
+
+# only the columns the aggregation and plots read
+DTYPES = {
+    "clients": "Int64",
+    "rps": "float64",
+    "p50_ms": "float64",
+    "p95_ms": "float64",
+    "p99_ms": "float64",
+    "ok": "float64",
+    "fail": "float64",
+}
+
+def load_and_aggregate(path):
+    df = read_numeric_csv(path, DTYPES)
+
+    # fused into one expression; pandas runs it through numexpr when that is installed.
+    # 0/0 (no requests in the run) comes out as NaN, like the masked division it replaces
+    ok_rate = df.eval("ok / (ok + fail)")
+    df["ok_rate"] = ok_rate.where(np.isfinite(ok_rate))
     df = df.dropna(subset=["clients","rps","p50_ms","p95_ms","p99_ms"])
+    rps = df["rps"].to_numpy(float)
+    clients = df["clients"].to_numpy(float)
+    df["rps_per_client"] = np.divide(rps, clients, out=np.full_like(rps, np.nan), where=clients != 0)
 
-    g = df.groupby("clients", as_index=False)
+    # aggregate per clients; the same grouping also yields the per-clients p95 values for the boxplot
+    g = df.groupby("clients", sort=True)
 
     agg = g.agg(
         rps_mean=("rps","mean"),
@@ -35,85 +42,73 @@ def main():
         p99_std=("p99_ms","std"),
         ok_rate_mean=("ok_rate","mean"),
         ok_rate_std=("ok_rate","std"),
-    ).sort_values("clients")
-
-    clients = agg["clients"].tolist()
-
-    # 1) RPS vs clients (mean ± std)
-    plt.figure(figsize=(10,6))
-    plt.errorbar(agg["clients"], agg["rps_mean"], yerr=agg["rps_std"], marker="o", capsize=4)
-    plt.xlabel("Clients")
-    plt.ylabel("Requests/sec (mean ± std)")
-    plt.title(f"{args.title}: throughput (RPS)")
-    plt.grid(True)
-    plt.savefig(os.path.join(args.outdir, "search_rps_vs_clients.png"), dpi=args.dpi, bbox_inches="tight")
-
-    # 2) Latency percentiles vs clients (mean ± std)
-    plt.figure(figsize=(10,6))
-    plt.errorbar(agg["clients"], agg["p50_mean"], yerr=agg["p50_std"], marker="o", capsize=4, label="p50")
-    plt.errorbar(agg["clients"], agg["p95_mean"], yerr=agg["p95_std"], marker="o", capsize=4, label="p95")
-    plt.errorbar(agg["clients"], agg["p99_mean"], yerr=agg["p99_std"], marker="o", capsize=4, label="p99")
-    plt.xlabel("Clients")
-    plt.ylabel("Latency (ms, mean ± std across runs)")
-    plt.title(f"{args.title}: latency percentiles")
-    plt.grid(True)
-    plt.legend()
-    plt.savefig(os.path.join(args.outdir, "search_latency_vs_clients.png"), dpi=args.dpi, bbox_inches="tight")
-
-    # 3) Boxplot of p95 across runs per clients
-    data = []
-    labels = []
-    for c in clients:
-        vals = df.loc[df["clients"] == c, "p95_ms"].dropna().tolist()
-        if vals:
-            data.append(vals)
-            labels.append(str(int(c)))
-    if data:
-        plt.figure(figsize=(12,6))
-        plt.boxplot(data, labels=labels, showfliers=True)
-        plt.xlabel("Clients")
-        plt.ylabel("p95 latency (ms) distribution across runs")
-        plt.title(f"{args.title}: p95 distribution (boxplot)")
-        plt.grid(True)
-        plt.savefig(os.path.join(args.outdir, "search_p95_boxplot.png"), dpi=args.dpi, bbox_inches="tight")
-
-    # 4) Throughput vs p95 scatter (каждый прогон — точка)
-    plt.figure(figsize=(10,6))
-    plt.plot(df["rps"], df["p95_ms"], marker="o", linestyle="None")
-    plt.xlabel("Requests/sec (per run)")
-    plt.ylabel("p95 latency (ms, per run)")
-    plt.title(f"{args.title}: throughput-latency tradeoff")
-    plt.grid(True)
-    plt.savefig(os.path.join(args.outdir, "search_rps_vs_p95_scatter.png"), dpi=args.dpi, bbox_inches="tight")
-
-    # 5) Efficiency: RPS per client
-    df["rps_per_client"] = df["rps"] / df["clients"].replace(0, pd.NA)
-    agg2 = df.groupby("clients", as_index=False).agg(
         rpc_mean=("rps_per_client","mean"),
         rpc_std=("rps_per_client","std"),
-        ok_rate_mean=("ok_rate","mean"),
-        ok_rate_std=("ok_rate","std"),
-    ).sort_values("clients")
+    ).reset_index()
+    groups = {c: vals.to_numpy() for c, vals in g["p95_ms"]}
+    return df, agg, groups
+
+def plot_scatter(path, title, dpi, rps, p95_ms):
+    ax = new_axes()
+    if len(rps) > SCATTER_MAX_POINTS:
+        # too many overlapping markers: small translucent points, stored as one raster
+        ax.scatter(rps, p95_ms, s=4, alpha=0.3, rasterized=True)
+    else:
+        ax.plot(rps, p95_ms, marker="o", markersize=3, linestyle="None", rasterized=True)
+    ax.set_xlabel("Requests/sec (per run)")
+    ax.set_ylabel("p95 latency (ms, per run)")
+    ax.set_title(f"{title}: throughput-latency tradeoff")
+    ax.grid(True)
+    save_figure(ax.figure, path, dpi)
 
-    plt.figure(figsize=(10,6))
-    plt.errorbar(agg2["clients"], agg2["rpc_mean"], yerr=agg2["rpc_std"], marker="o", capsize=4)
-    plt.xlabel("Clients")
-    plt.ylabel("RPS per client (mean ± std)")
-    plt.title(f"{args.title}: efficiency (RPS/client)")
-    plt.grid(True)
-    plt.savefig(os.path.join(args.outdir, "search_efficiency.png"), dpi=args.dpi, bbox_inches="tight")
+def main():
+    ap = base_parser("search_summary.csv", "Search benchmark")
+    args = ap.parse_args()
 
-    # 6) OK rate vs clients
-    plt.figure(figsize=(10,6))
-    plt.errorbar(agg["clients"], agg["ok_rate_mean"], yerr=agg["ok_rate_std"], marker="o", capsize=4)
-    plt.xlabel("Clients")
-    plt.ylabel("OK rate (ok/(ok+fail)) mean ± std")
-    plt.title(f"{args.title}: success rate")
-    plt.grid(True)
-    plt.ylim(0, 1.02)
-    plt.savefig(os.path.join(args.outdir, "search_ok_rate.png"), dpi=args.dpi, bbox_inches="tight")
+    os.makedirs(args.outdir, exist_ok=True)
+    df, agg, groups = load_cached(args.input, args.outdir, "search", load_and_aggregate, not args.no_cache)
+
+    clients = agg["clients"].to_numpy(float)
+    col = lambda name: agg[name].to_numpy()
+    out = lambda name: os.path.join(args.outdir, f"{name}.{args.format}")
+
+    # 3) boxplot data: p95 across runs per clients
+    stats = [box_stats(vals, f"{c:g}") for c, vals in groups.items()]
+
+    tasks = [
+        # 1) RPS vs clients (mean ± std)
+        (plot_errorbar, out("search_rps_vs_clients"), f"{args.title}: throughput (RPS)",
+         "Clients", "Requests/sec (mean ± std)", args.dpi, clients,
+         [(None, col("rps_mean"), col("rps_std"))]),
+        # 2) Latency percentiles vs clients (mean ± std)
+        (plot_errorbar, out("search_latency_vs_clients"), f"{args.title}: latency percentiles",
+         "Clients", "Latency (ms, mean ± std across runs)", args.dpi, clients,
+         [(p, col(f"{p}_mean"), col(f"{p}_std")) for p in ("p50", "p95", "p99")]),
+        # 4) Throughput vs p95 scatter (каждый прогон — точка)
+        (plot_scatter, out("search_rps_vs_p95_scatter"), args.title, args.dpi,
+         df["rps"].to_numpy(), df["p95_ms"].to_numpy()),
+        # 5) Efficiency: RPS per client
+        (plot_errorbar, out("search_efficiency"), f"{args.title}: efficiency (RPS/client)",
+         "Clients", "RPS per client (mean ± std)", args.dpi, clients,
+         [(None, col("rpc_mean"), col("rpc_std"))]),
+        # 6) OK rate vs clients
+        (plot_errorbar, out("search_ok_rate"), f"{args.title}: success rate",
+         "Clients", "OK rate (ok/(ok+fail)) mean ± std", args.dpi, clients,
+         [(None, col("ok_rate_mean"), col("ok_rate_std"))], (0, 1.02)),
+    ]
+    if stats:
+        tasks.append((plot_boxplot, out("search_p95_boxplot"),
+                      f"{args.title}: p95 distribution (boxplot)", "Clients",
+                      "p95 latency (ms) distribution across runs", args.dpi, stats))
+
+    render(tasks)
+
+    # save aggregated table too
+    saved = save_aggregated(agg, os.path.join(args.outdir, "search_aggregated"), write_csv=not args.no_csv)
 
     print("Saved plots to:", args.outdir)
+    for path in saved:
+        print("Saved aggregated:", path)
 
 if __name__ == "__main__":
     main()